@@ -1,28 +1,267 @@
 import numpy as np
-from typing import List, Dict, Any
-from elasticsearch import Elasticsearch
+from typing import List, Dict, Any, Iterator, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch import ApiError, Elasticsearch
+from elasticsearch.helpers import parallel_bulk
+from elasticsearch.serializer import OrjsonSerializer
 from langchain_openai import OpenAIEmbeddings
-import os, logging, time
+from openai import RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+import orjson
+import functools, hashlib, os, logging, threading, time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 임베딩 요청 1회당 문서 수
+EMBED_BATCH_SIZE = 128
+
+# OpenAI 사용 등급(OPENAI_USAGE_TIER)별 임베딩 동시 요청 수
+EMBED_CONCURRENCY_BY_TIER = {
+    "free": 1,
+    "tier1": 5,
+    "tier2": 10,
+    "tier3": 20,
+    "tier4": 20,
+    "tier5": 20
+}
+
+# bulk 인덱싱 설정 (요청당 500건, 10MB 이하로 8개 스레드 병렬 전송)
+BULK_THREAD_COUNT = 8
+BULK_QUEUE_SIZE = 4
+BULK_CHUNK_SIZE = 500
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# 색인/검색 시 제거할 Nori 품사 태그
+# (keep_types 필터는 토큰 type 속성만 보므로 Nori 품사로는 걸러낼 수 없음)
+NORI_STOPTAGS = [
+    "E", "IC", "J", "MAG", "MAJ", "MM", "SP", "SSC", "SSO",
+    "SC", "SE", "XPN", "XSA", "XSN", "XSV", "UNA", "NA", "VSV"
+]
+
+# 벡터 필드 HNSW 그래프 설정
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+
+# kNN 검색 시 탐색 후보 수 기본값: max(top_k * 4, 100), 최대 10000
+MIN_NUM_CANDIDATES = 100
+MAX_NUM_CANDIDATES = 10000
+
+# 하이브리드 검색 RRF 순위 상수 (클수록 하위 순위 문서의 기여도가 커짐)
+RRF_RANK_CONSTANT = 60
+
+# 검색 응답에서 받을 필드
+SEARCH_FILTER_PATH = "hits.hits._id,hits.hits._score,hits.hits._source"
+MSEARCH_FILTER_PATH = "responses.hits.hits._id,responses.hits.hits._score,responses.hits.hits._source,responses.error"
+
+# Redis 캐시 TTL (초)
+QUERY_EMBEDDING_TTL = 7 * 24 * 60 * 60
+DOCUMENT_EMBEDDING_TTL = 7 * 24 * 60 * 60
+SEARCH_RESULT_TTL = 60 * 60
+
+# 인덱스 refresh 주기 (초). 마지막 쓰기 후 이 시간 안의 검색 결과는 아직 반영 전일 수 있어 캐시하지 않음
+INDEX_REFRESH_INTERVAL = 30
+
+# 프로세스 내에 보관할 쿼리 분석 결과 수
+ANALYZE_CACHE_SIZE = 1024
+
+# Redis가 없을 때 프로세스 내에 보관할 문서 임베딩 수
+LOCAL_EMBEDDING_CACHE_SIZE = 4096
+
+def _l2_normalize(vectors) -> np.ndarray:
+    """벡터를 L2 정규화 (dot_product 유사도는 단위 벡터를 전제로 함)"""
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    arr /= norms
+    return arr
+
+def _parse_hits(body: Dict) -> List[Dict]:
+    """검색 응답 본문을 결과 목록으로 변환 (결과가 없으면 filter_path로 인해 hits 키가 생략됨)"""
+    return [
+        {
+            "id": hit["_id"],
+            "score": hit["_score"],
+            "content": hit["_source"].get("content"),
+            "metadata": hit["_source"].get("metadata")
+        }
+        for hit in body.get("hits", {}).get("hits", [])
+    ]
+
+def _clamp_num_candidates(num_candidates: int, k: int) -> int:
+    """kNN 탐색 후보 수를 k 이상, MAX_NUM_CANDIDATES 이하로 조정 (k는 MAX_NUM_CANDIDATES 이하)"""
+    return min(max(num_candidates, k), MAX_NUM_CANDIDATES)
+
+def _rrf_unsupported(error: ApiError) -> bool:
+    """서버가 RRF retriever 자체를 지원하지 않아 발생한 오류인지 확인 (라이선스 미지원, 구버전)"""
+    body = error.body if isinstance(error.body, dict) else {}
+    cause = body.get("error")
+    if not isinstance(cause, dict):
+        return False
+
+    causes = [cause] + cause.get("root_cause", [])
+    types = {c.get("type") for c in causes}
+    reasons = " ".join(str(c.get("reason", "")) for c in causes).lower()
+
+    if error.meta.status == 403:
+        # 예: current license is non-compliant for [Reciprocal Rank Fusion (RRF)]
+        return "security_exception" in types and "license" in reasons
+    if error.meta.status == 400:
+        # 예: unknown field [retriever], unknown retriever [rrf]
+        return bool(types & {"parsing_exception", "x_content_parse_exception"}) and (
+            "rrf" in reasons or "retriever" in reasons
+        )
+    return False
+
+def _reciprocal_rank_fusion(result_lists: List[List[Dict]], top_k: int) -> List[Dict]:
+    """여러 검색 결과를 순위 기반으로 결합 (score = Σ 1 / (RRF_RANK_CONSTANT + 순위))"""
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            entry = fused.setdefault(result["id"], {**result, "score": 0.0})
+            entry["score"] += 1.0 / (RRF_RANK_CONSTANT + rank)
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:top_k]
+
+class _LRUCache:
+    """Redis가 없을 때 사용하는 프로세스 내 LRU 캐시 (스레드 안전)"""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            values = []
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                values.append(value)
+            return values
+
+    def set_many(self, mapping: Dict[str, bytes]):
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
 class ElasticsearchHandler:
-    def __init__(self, host: str = None, port: int = None, index_name: str = None):
+    """Nori BM25와 OpenAI 임베딩 벡터 검색을 함께 제공하는 Elasticsearch 핸들러
+
+    벡터 검색은 HNSW 그래프 기반 근사 검색(ANN)이며, 재현율과 지연시간은 다음 값으로 조정:
+    - HNSW_M: 노드당 연결 수 (클수록 재현율↑, 메모리·색인 시간↑)
+    - HNSW_EF_CONSTRUCTION: 색인 시 탐색 후보 수 (클수록 그래프 품질↑, 색인 시간↑)
+    - num_candidates: 검색 시 샤드별 탐색 후보 수 (클수록 재현율↑, 지연시간↑)
+    정확한 전수 비교(exact kNN)보다 빠르지만 근사 결과이므로, 재현율이 부족할 때만 num_candidates를 늘림
+    """
+    def __init__(self, host: str = None, port: int = None, index_name: str = None, redis_url: str = None):
         self.host = host or os.getenv("ELASTICSEARCH_HOST", "localhost")
         self.port = port or os.getenv("ELASTICSEARCH_PORT", "9200")
         self.index_name = index_name
         self.embedding_dim = 1536  # OpenAI embedding dimension
         self.embeddings = OpenAIEmbeddings()
+        self.embed_concurrency = EMBED_CONCURRENCY_BY_TIER.get(
+            os.getenv("OPENAI_USAGE_TIER", "tier1").lower(), EMBED_CONCURRENCY_BY_TIER["tier1"]
+        )
+        self.redis = self._connect_redis(redis_url or os.getenv("REDIS_URL"))
+        self._local_cache = _LRUCache(LOCAL_EMBEDDING_CACHE_SIZE)
+        self._server_rrf = True  # 서버 RRF 미지원 확인 시 클라이언트 RRF 사용
+        self._analyze_cached = functools.lru_cache(maxsize=ANALYZE_CACHE_SIZE)(self._analyze_tokens)
         
         self._connect()
         self._setup_index()
 
+    def _connect_redis(self, redis_url: str):
+        """Redis 캐시 연결 (설정이 없거나 연결 실패 시 캐시 없이 동작)"""
+        if not redis_url:
+            return None
+        if redis is None:
+            logging.warning("redis 패키지가 없어 캐시 없이 동작합니다")
+            return None
+        try:
+            client = redis.Redis.from_url(redis_url)
+            client.ping()
+            logging.info(f"Redis 캐시에 연결됨: {redis_url}")
+            return client
+        except Exception as e:
+            logging.warning(f"Redis 연결 실패, 캐시 없이 동작합니다: {e}")
+            return None
+
+    def _cache_get(self, key: str):
+        """Redis 캐시 조회 (캐시가 없거나 오류 시 None)"""
+        if not self.redis:
+            return None
+        try:
+            return self.redis.get(key)
+        except Exception as e:
+            logging.warning(f"캐시 조회 실패: {e}")
+            return None
+
+    def _cache_set(self, key: str, ttl: int, value: bytes):
+        """Redis 캐시 저장 (캐시가 없거나 오류 시 무시)"""
+        if not self.redis:
+            return
+        try:
+            self.redis.setex(key, ttl, value)
+        except Exception as e:
+            logging.warning(f"캐시 저장 실패: {e}")
+
+    def _result_generation(self) -> int:
+        """인덱스의 검색 결과 캐시 세대 (마지막 쓰기 시각 ns, 기록이 없으면 0)"""
+        cached = self._cache_get(f"gen:{self.index_name}")
+        return int(cached) if cached is not None else 0
+
+    def _bump_result_generation(self):
+        """인덱스 쓰기를 기록해 이전 세대의 검색 결과 캐시를 무효화"""
+        if not self.redis:
+            return
+        try:
+            self.redis.set(f"gen:{self.index_name}", time.time_ns())
+        except Exception as e:
+            logging.warning(f"캐시 세대 갱신 실패: {e}")
+
+    def _cache_get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """문서 임베딩 캐시 일괄 조회 (Redis가 없으면 프로세스 내 LRU 사용)"""
+        if not self.redis:
+            return self._local_cache.get_many(keys)
+        try:
+            return self.redis.mget(keys)
+        except Exception as e:
+            logging.warning(f"캐시 조회 실패: {e}")
+            return [None] * len(keys)
+
+    def _cache_set_many(self, mapping: Dict[str, bytes], ttl: int):
+        """문서 임베딩 캐시 일괄 저장 (Redis가 없으면 프로세스 내 LRU 사용)"""
+        if not self.redis:
+            self._local_cache.set_many(mapping)
+            return
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipeline.setex(key, ttl, value)
+            pipeline.execute()
+        except Exception as e:
+            logging.warning(f"캐시 저장 실패: {e}")
+
     def _connect(self):
         """Elasticsearch 연결"""
         try:
             self.client = Elasticsearch(
                 hosts=[f"http://{self.host}:{self.port}"],
-                timeout=30,
+                request_timeout=30,
                 max_retries=10,
-                retry_on_timeout=True
+                retry_on_timeout=True,
+                # 동시 요청이 많을 때 연결을 새로 맺지 않도록 keep-alive 연결 풀 확대 (기본값 10)
+                connections_per_node=50,
+                # 임베딩 벡터가 포함된 bulk 요청 본문을 gzip 압축
+                http_compress=True,
+                # numpy 배열을 그대로 직렬화하는 orjson 사용 (임베딩 벡터 인코딩 비용 절감)
+                serializer=OrjsonSerializer()
             )
             
             # 연결 확인
@@ -50,6 +289,15 @@ class ElasticsearchHandler:
         """Nori 토크나이저를 사용한 인덱스 생성"""
         try:
             settings = {
+                # 배치마다 refresh하지 않고 주기적으로 refresh (쓰기 위주 워크로드)
+                "index": {
+                    "refresh_interval": f"{INDEX_REFRESH_INTERVAL}s",
+                    "translog": {
+                        "durability": "async",
+                        "sync_interval": "5s",
+                        "flush_threshold_size": "1gb"
+                    }
+                },
                 "analysis": {
                     "tokenizer": {
                         "nori_user_dict": {
@@ -72,7 +320,7 @@ class ElasticsearchHandler:
                     "filter": {
                         "nori_part_of_speech": {
                             "type": "nori_part_of_speech",
-                            "stoptags": ["E", "IC", "J", "MAG", "MAJ", "MM", "SP", "SSC", "SSO", "SC", "SE", "XPN", "XSA", "XSN", "XSV", "UNA", "NA", "VSV"]
+                            "stoptags": NORI_STOPTAGS
                         }
                     }
                 },
@@ -92,11 +340,18 @@ class ElasticsearchHandler:
                         "analyzer": "nori_analyzer",
                         "similarity": "bm25_korean"
                     },
+                    # 벡터는 저장 전에 L2 정규화되므로 크기가 항상 1
+                    # (별도 magnitude 필드나 script_score 없이 dot_product로 코사인 유사도 계산)
                     "embedding": {
                         "type": "dense_vector",
                         "dims": self.embedding_dim,
                         "index": True,
-                        "similarity": "cosine"
+                        "similarity": "dot_product",
+                        "index_options": {
+                            "type": "int8_hnsw",
+                            "m": HNSW_M,
+                            "ef_construction": HNSW_EF_CONSTRUCTION
+                        }
                     },
                     "metadata": {
                         "type": "object",
@@ -117,16 +372,61 @@ class ElasticsearchHandler:
             logging.error(f"인덱스 생성 실패: {e}")
             raise
 
-    def insert_embeddings(self, contents: List[str], metadata_list: List[Dict]) -> bool:
-        """문서 임베딩 생성 후 Elasticsearch에 저장"""
-        try:
-            # 임베딩 생성
-            embeddings = self.embeddings.embed_documents(contents)
-            
-            # 배치 인덱싱을 위한 문서 준비
-            actions = []
-            for i, (content, embedding, metadata) in enumerate(zip(contents, embeddings, metadata_list)):
-                doc = {
+    @retry(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_exponential(multiplier=1, min=1, max=60),
+        stop=stop_after_attempt(5),
+        reraise=True
+    )
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """배치 하나의 임베딩 생성 (rate limit 시 지수 백오프 재시도)"""
+        return self.embeddings.embed_documents(batch)
+
+    def _embed_documents(self, contents: List[str]) -> np.ndarray:
+        """정규화된 문서 임베딩 생성 (내용 해시로 캐시된 임베딩은 재사용)"""
+        if not contents:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+
+        keys = [f"emb:doc:{hashlib.sha256(content.encode()).hexdigest()}" for content in contents]
+        embeddings = [
+            np.frombuffer(cached, dtype=np.float32) if cached is not None else None
+            for cached in self._cache_get_many(keys)
+        ]
+
+        # 캐시에 없는 내용만 (중복 제거 후) 임베딩 생성
+        missing = {}
+        for key, content, embedding in zip(keys, contents, embeddings):
+            if embedding is None:
+                missing.setdefault(key, content)
+
+        if missing:
+            fresh = dict(zip(missing, _l2_normalize(self._embed_batch(list(missing.values())))))
+            self._cache_set_many({key: vector.tobytes() for key, vector in fresh.items()}, DOCUMENT_EMBEDDING_TTL)
+            embeddings = [fresh[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+            logging.debug(f"임베딩 캐시: {len(contents) - len(missing)}개 재사용, {len(missing)}개 생성")
+
+        return np.vstack(embeddings)
+
+    def _iter_embeddings(self, contents: List[str]) -> Iterator[np.ndarray]:
+        """EMBED_BATCH_SIZE 단위로 동시에 임베딩을 생성해 입력 순서대로 반환
+
+        동시에 진행하는 배치 수를 embed_concurrency로 제한해 메모리 사용량을 일정하게 유지
+        """
+        with ThreadPoolExecutor(max_workers=self.embed_concurrency) as executor:
+            pending = deque()
+            for start in range(0, len(contents), EMBED_BATCH_SIZE):
+                pending.append(executor.submit(self._embed_documents, contents[start:start + EMBED_BATCH_SIZE]))
+                if len(pending) >= self.embed_concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _generate_actions(self, contents: List[str], metadata_list: List[Dict]) -> Iterator[Dict]:
+        """bulk 인덱싱 액션을 임베딩 배치가 준비되는 대로 하나씩 생성"""
+        documents = zip(contents, metadata_list)
+        for embeddings in self._iter_embeddings(contents):
+            for embedding, (content, metadata) in zip(embeddings, documents):
+                yield {
                     "_index": self.index_name,
                     "_source": {
                         "content": content,
@@ -134,100 +434,195 @@ class ElasticsearchHandler:
                         "metadata": metadata
                     }
                 }
-                actions.append(doc)
 
-            # 배치 인덱싱 실행
-            from elasticsearch.helpers import bulk
-            success, failed = bulk(self.client, actions)
-            
-            # 인덱스 새로고침
-            self.client.indices.refresh(index=self.index_name)
+    def insert_embeddings(self, contents: List[str], metadata_list: List[Dict]) -> bool:
+        """문서 임베딩 생성 후 Elasticsearch에 저장
+
+        embedding 필드는 dot_product 유사도를 사용하므로 저장하는 벡터는 항상 L2 정규화되어 있어야 함
+        """
+        try:
+            # 임베딩 생성과 인덱싱을 스트리밍으로 처리 (전체 액션 목록을 메모리에 올리지 않음)
+            # parallel_bulk는 대기 중인 청크 수를 max(queue_size, thread_count)로 제한하므로 액션을 필요한 만큼만 생성
+            failed = 0
+            for ok, info in parallel_bulk(
+                self.client.options(request_timeout=60),
+                self._generate_actions(contents, metadata_list),
+                thread_count=BULK_THREAD_COUNT,
+                queue_size=BULK_QUEUE_SIZE,
+                chunk_size=BULK_CHUNK_SIZE,
+                max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+                raise_on_error=False
+            ):
+                if not ok:
+                    failed += 1
+                    logging.warning(f"문서 인덱싱 실패: {info}")
             
-            logging.info(f"임베딩 저장 완료: {len(contents)}개의 문서")
-            return True
+            logging.info(f"임베딩 저장 완료: {len(contents) - failed}개의 문서 (실패 {failed}개)")
+            return failed == 0
             
         except Exception as e:
             logging.error(f"데이터 삽입 실패: {e}")
             return False
+        finally:
+            # 일부만 저장된 경우에도 이전 검색 결과 캐시는 무효화
+            self._bump_result_generation()
+
+    def _get_query_embedding(self, query_text: str, query_hash: str) -> np.ndarray:
+        """쿼리 임베딩 생성 및 정규화 (캐시 우선)"""
+        key = f"emb:{query_hash}"
+        cached = self._cache_get(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32)
+
+        # 문서 벡터와 같은 단위 벡터 공간으로 정규화
+        query_embedding = _l2_normalize(self.embeddings.embed_query(query_text))
+        self._cache_set(key, QUERY_EMBEDDING_TTL, query_embedding.tobytes())
+        return query_embedding
+
+    def _analyze_tokens(self, text: str) -> tuple:
+        """Nori 분석기로 토큰 추출 (실패 시 예외를 그대로 올려 캐시되지 않도록 함)"""
+        response = self.client.indices.analyze(
+            index=self.index_name,
+            body={
+                "analyzer": "nori_analyzer",
+                "text": text
+            }
+        )
+        return tuple(token['token'] for token in response['tokens'])
+
+    def _bm25_query(self, query_text: str) -> Dict:
+        """BM25 쿼리 (캐시된 Nori 분석 결과로 term 쿼리를 구성해 검색 시 재분석 생략)"""
+        try:
+            tokens = self._analyze_cached(query_text)
+        except Exception as e:
+            logging.warning(f"쿼리 분석 실패, match 쿼리로 검색: {e}")
+            return {
+                "match": {
+                    "content": {
+                        "query": query_text,
+                        "analyzer": "nori_analyzer"
+                    }
+                }
+            }
+
+        # match 쿼리와 마찬가지로 분석 결과 토큰이 없으면 아무 문서도 매칭하지 않음
+        if not tokens:
+            return {"match_none": {}}
+        return {
+            "bool": {
+                "should": [{"term": {"content": token}} for token in tokens]
+            }
+        }
+
+    def _search(self, query: Dict) -> List[Dict]:
+        """검색 실행 (필요한 필드만 응답받으며, ES가 _score 내림차순으로 정렬해 반환하므로 별도 정렬 불필요)"""
+        response = self.client.search(
+            index=self.index_name,
+            body=query,
+            filter_path=SEARCH_FILTER_PATH
+        )
+        return _parse_hits(response.body)
+
+    def _search_hybrid(self, query_text: str, query_hash: str, top_k: int, num_candidates: int) -> List[Dict]:
+        """하이브리드 검색 (BM25와 벡터 검색 결과를 점수가 아닌 순위로 결합하는 RRF)
+
+        서버 RRF retriever를 사용할 수 없으면(라이선스 미지원, 구버전) 두 검색을 _msearch로 한 번에 보내고 클라이언트에서 결합
+        """
+        rank_window_size = min(top_k * 4, MAX_NUM_CANDIDATES)
+        bm25_query = self._bm25_query(query_text)
+        knn_query = {
+            "field": "embedding",
+            "query_vector": self._get_query_embedding(query_text, query_hash),
+            "k": rank_window_size,
+            "num_candidates": _clamp_num_candidates(num_candidates, rank_window_size)
+        }
 
-    def search_similar(self, query_text: str, top_k: int = 5, search_type: str = "hybrid") -> List[Dict]:
-        """유사도 검색 (하이브리드: 벡터 + BM25)"""
+        if self._server_rrf:
+            try:
+                return self._search({
+                    "retriever": {
+                        "rrf": {
+                            "retrievers": [
+                                {"standard": {"query": bm25_query}},
+                                {"knn": knn_query}
+                            ],
+                            "rank_window_size": rank_window_size,
+                            "rank_constant": RRF_RANK_CONSTANT
+                        }
+                    },
+                    "size": top_k,
+                    "_source": ["content", "metadata"]
+                })
+            except ApiError as e:
+                # 이번 쿼리만의 오류(잘못된 파라미터 등)는 그대로 올리고, RRF 자체를 지원하지 않을 때만 영구 전환
+                if not _rrf_unsupported(e):
+                    raise
+                logging.warning(f"서버 RRF를 사용할 수 없어 클라이언트 RRF로 전환: {e}")
+                self._server_rrf = False
+
+        response = self.client.msearch(
+            searches=[
+                {"index": self.index_name},
+                {"query": bm25_query, "size": rank_window_size, "_source": ["content", "metadata"]},
+                {"index": self.index_name},
+                {"knn": knn_query, "size": rank_window_size, "_source": ["content", "metadata"]}
+            ],
+            filter_path=MSEARCH_FILTER_PATH
+        )
+
+        result_lists = []
+        for item in response.body.get("responses", []):
+            if "error" in item:
+                raise Exception(f"하이브리드 하위 검색 실패: {item['error']}")
+            result_lists.append(_parse_hits(item))
+        return _reciprocal_rank_fusion(result_lists, top_k)
+
+    def search_similar(self, query_text: str, top_k: int = 5, search_type: str = "hybrid",
+                       num_candidates: int = None) -> List[Dict]:
+        """유사도 검색 (하이브리드: 벡터 + BM25)
+
+        num_candidates는 kNN 검색 시 샤드별 HNSW 탐색 후보 수 (기본값: max(top_k * 4, 100), 최대 10000)
+        top_k는 최대 MAX_NUM_CANDIDATES개까지만 반환
+        """
         try:
-            # 쿼리 임베딩 생성
-            query_embedding = self.embeddings.embed_query(query_text)
+            if top_k > MAX_NUM_CANDIDATES:
+                logging.warning(f"top_k({top_k})가 최대값을 넘어 {MAX_NUM_CANDIDATES}로 조정")
+                top_k = MAX_NUM_CANDIDATES
+
+            num_candidates = _clamp_num_candidates(num_candidates or max(top_k * 4, MIN_NUM_CANDIDATES), top_k)
+
+            # 동일 쿼리 결과 캐시 확인
+            query_hash = hashlib.blake2b(query_text.encode(), digest_size=16).hexdigest()
+            generation = self._result_generation()
+            result_key = f"res:{self.index_name}:{generation}:{query_hash}:{top_k}:{search_type}:{num_candidates}"
+            cached = self._cache_get(result_key)
+            if cached is not None:
+                return orjson.loads(cached)
             
             if search_type == "vector":
                 # 순수 벡터 검색
-                query = {
+                search_results = self._search({
                     "knn": {
                         "field": "embedding",
-                        "query_vector": query_embedding,
+                        "query_vector": self._get_query_embedding(query_text, query_hash),
                         "k": top_k,
-                        "num_candidates": top_k * 10
+                        "num_candidates": _clamp_num_candidates(num_candidates, top_k)
                     },
                     "_source": ["content", "metadata"]
-                }
+                })
             elif search_type == "bm25":
                 # 순수 BM25 검색
-                query = {
-                    "query": {
-                        "match": {
-                            "content": {
-                                "query": query_text,
-                                "analyzer": "nori_analyzer"
-                            }
-                        }
-                    },
-                    "size": top_k,
-                    "_source": ["content", "metadata"]
-                }
-            else:  # hybrid
-                # 하이브리드 검색 (벡터 + BM25)
-                query = {
-                    "query": {
-                        "bool": {
-                            "should": [
-                                {
-                                    "match": {
-                                        "content": {
-                                            "query": query_text,
-                                            "analyzer": "nori_analyzer",
-                                            "boost": 1.0
-                                        }
-                                    }
-                                }
-                            ]
-                        }
-                    },
-                    "knn": {
-                        "field": "embedding",
-                        "query_vector": query_embedding,
-                        "k": top_k,
-                        "num_candidates": top_k * 10,
-                        "boost": 1.0
-                    },
+                search_results = self._search({
+                    "query": self._bm25_query(query_text),
                     "size": top_k,
                     "_source": ["content", "metadata"]
-                }
-
-            # 검색 실행
-            response = self.client.search(
-                index=self.index_name,
-                body=query
-            )
-
-            # 결과 처리
-            search_results = []
-            for hit in response['hits']['hits']:
-                search_results.append({
-                    "id": hit['_id'],
-                    "score": hit['_score'],
-                    "content": hit['_source'].get('content'),
-                    "metadata": hit['_source'].get('metadata')
                 })
+            else:  # hybrid
+                search_results = self._search_hybrid(query_text, query_hash, top_k, num_candidates)
 
-            # 점수 기준 정렬 (높은 점수 순)
-            search_results.sort(key=lambda x: x['score'], reverse=True)
+            # 최근 쓰기가 아직 refresh 전일 수 있으면 결과를 캐시하지 않음
+            if time.time_ns() - generation >= INDEX_REFRESH_INTERVAL * 1_000_000_000:
+                self._cache_set(result_key, SEARCH_RESULT_TTL, orjson.dumps(search_results))
 
             logging.info(f"유사도 검색 완료: {len(search_results)}개의 결과")
             return search_results
@@ -239,15 +634,7 @@ class ElasticsearchHandler:
     def analyze_text(self, text: str) -> Dict:
         """Nori 토크나이저로 텍스트 분석"""
         try:
-            response = self.client.indices.analyze(
-                index=self.index_name,
-                body={
-                    "analyzer": "nori_analyzer",
-                    "text": text
-                }
-            )
-            
-            tokens = [token['token'] for token in response['tokens']]
+            tokens = list(self._analyze_cached(text))
             return {
                 "original": text,
                 "tokens": tokens,
@@ -257,6 +644,14 @@ class ElasticsearchHandler:
             logging.error(f"텍스트 분석 실패: {e}")
             return {}
 
+    def refresh(self):
+        """인덱스 새로고침 (저장 직후 검색 결과에 바로 반영해야 할 때 호출)"""
+        try:
+            self.client.indices.refresh(index=self.index_name)
+            self._bump_result_generation()
+        except Exception as e:
+            logging.error(f"인덱스 새로고침 실패: {e}")
+
     def get_index_stats(self) -> Dict:
         """인덱스 통계 정보"""
         try:
@@ -275,6 +670,8 @@ class ElasticsearchHandler:
         try:
             if hasattr(self, 'client'):
                 self.client.close()
+            if getattr(self, 'redis', None):
+                self.redis.close()
             logging.info("Elasticsearch 연결 종료")
         except Exception as e:
             logging.error(f"Elasticsearch 연결 종료 실패: {e}")
\ No newline at end of file
@@ -1,7 +1,10 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from elasticsearch import Elasticsearch
+from elasticsearch import ApiError, AsyncElasticsearch, ConnectionError, ConnectionTimeout
+from elastic_transport import TlsError
+from elasticsearch.helpers import async_bulk
 from typing import List, Optional, Dict, Any
+import asyncio
 import json
 import logging
 
@@ -11,12 +14,14 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Elasticsearch BM25 Search API", version="1.0.0")
 
-# Elasticsearch 클라이언트 초기화
-es = Elasticsearch(
+# Elasticsearch 클라이언트 초기화 (이벤트 루프를 막지 않도록 비동기 클라이언트 사용)
+es = AsyncElasticsearch(
     hosts=["http://localhost:9200"],
     request_timeout=30,
     max_retries=3,
-    retry_on_timeout=True
+    retry_on_timeout=True,
+    # 동시 요청이 많을 때 연결을 새로 맺지 않도록 keep-alive 연결 풀 확대 (기본값 10)
+    connections_per_node=50
 )
 
 # Pydantic 모델들
@@ -30,6 +35,8 @@ class SearchQuery(BaseModel):
     query: str
     size: Optional[int] = 10
     category: Optional[str] = None
+    fuzzy: Optional[bool] = False  # 기본값은 정확 매칭 (빠른 경로)
+    prefix_length: int = 2
 
 class SearchResult(BaseModel):
     id: str
@@ -46,11 +53,118 @@ class SearchResponse(BaseModel):
 # 인덱스 이름
 INDEX_NAME = "documents"
 
+# 검색 응답에서 받을 필드
+SEARCH_FILTER_PATH = "took,hits.total.value,hits.hits._id,hits.hits._score,hits.hits._source"
+
+# 색인 버퍼 설정: INDEX_BATCH_SIZE개가 모이거나 FLUSH_INTERVAL초가 지나면 bulk 색인
+# 대기열이 INDEX_QUEUE_MAXSIZE만큼 차면 ES가 복구될 때까지 문서 추가 요청에 503 반환
+INDEX_BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+INDEX_QUEUE_MAXSIZE = 10000
+
+# bulk 색인 실패 시 재시도 설정 (종료 중에는 SHUTDOWN_MAX_RETRIES회까지만 재시도)
+MAX_RETRY_DELAY = 30.0
+SHUTDOWN_MAX_RETRIES = 3
+
+# 색인 버퍼 종료 신호
+_STOP = object()
+
+index_queue: Optional[asyncio.Queue] = None
+flush_task: Optional[asyncio.Task] = None
+flush_stopping = False
+
+def _index_action(document: Document) -> Dict[str, Any]:
+    """문서를 bulk 색인 액션으로 변환"""
+    return {
+        "_op_type": "index",
+        "_index": INDEX_NAME,
+        "_id": document.id,
+        "_source": {
+            "title": document.title,
+            "content": document.content,
+            "category": document.category
+        }
+    }
+
+async def _bulk_index(actions: List[Dict[str, Any]], refresh: bool = False):
+    """bulk API로 액션 일괄 색인"""
+    return await async_bulk(
+        es.options(request_timeout=30),
+        actions,
+        chunk_size=INDEX_BATCH_SIZE,
+        raise_on_error=False,
+        refresh="wait_for" if refresh else False
+    )
+
+def _is_transient_error(error: Exception) -> bool:
+    """재시도하면 성공할 수 있는 오류인지 확인 (연결 실패, 타임아웃, 429, 5xx)"""
+    if isinstance(error, (ConnectionError, ConnectionTimeout)):
+        return not isinstance(error, TlsError)
+    if isinstance(error, ApiError):
+        return error.meta.status == 429 or error.meta.status >= 500
+    return False
+
+async def _bulk_index_with_retry(actions: List[Dict[str, Any]]):
+    """버퍼에서 꺼낸 배치를 색인 (ES 일시 장애 시 성공할 때까지 재시도)
+
+    재시도하는 동안에는 대기열에서 새 문서를 꺼내지 않으므로, 대기열이 차면 문서 추가 요청에 503 반환
+    재시도해도 성공할 수 없는 오류(400, 401/403, 413 등)는 로그를 남기고 배치를 버림
+    """
+    attempt = 0
+    while True:
+        try:
+            success, errors = await _bulk_index(actions)
+            if errors:
+                logger.error(f"bulk 색인 중 {len(errors)}건 실패: {errors[:3]}")
+            logger.info(f"bulk 색인 완료: {success}건")
+            return
+        except Exception as e:
+            if not _is_transient_error(e):
+                logger.error(f"bulk 색인 실패로 {len(actions)}건 색인하지 못함 (재시도 불가 오류): {e}")
+                return
+            attempt += 1
+            if flush_stopping and attempt >= SHUTDOWN_MAX_RETRIES:
+                logger.error(f"종료 중 bulk 색인 실패로 {len(actions)}건 색인하지 못함: {e}")
+                return
+            delay = min(2 ** attempt, MAX_RETRY_DELAY)
+            logger.warning(f"bulk 색인 중 오류, {delay:.0f}초 후 재시도 ({attempt}회): {e}")
+            await asyncio.sleep(delay)
+
+async def _flush_index_queue():
+    """버퍼에 쌓인 문서를 주기적으로 bulk 색인 (종료 신호를 받으면 남은 배치까지 색인 후 종료)"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        action = await index_queue.get()
+        if action is _STOP:
+            break
+
+        actions = [action]
+        deadline = loop.time() + FLUSH_INTERVAL
+        while len(actions) < INDEX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                action = await asyncio.wait_for(index_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if action is _STOP:
+                stopping = True
+                break
+            actions.append(action)
+
+        await _bulk_index_with_retry(actions)
+
 @app.on_event("startup")
 async def startup_event():
-    """애플리케이션 시작 시 인덱스 생성"""
+    """애플리케이션 시작 시 인덱스 생성 및 색인 버퍼 시작"""
+    global index_queue, flush_task
+    index_queue = asyncio.Queue(maxsize=INDEX_QUEUE_MAXSIZE)
+    flush_task = asyncio.create_task(_flush_index_queue())
+
     try:
-        if not es.indices.exists(index=INDEX_NAME):
+        if not await es.indices.exists(index=INDEX_NAME):
             # BM25를 위한 인덱스 매핑 설정
             mapping = {
                 "mappings": {
@@ -72,6 +186,11 @@ async def startup_event():
                 },
                 "settings": {
                     "index": {
+                        # 요청마다 refresh하지 않고 주기적으로 refresh
+                        "refresh_interval": "5s",
+                        "translog": {
+                            "durability": "async"
+                        },
                         "similarity": {
                             "default": {
                                 "type": "BM25",
@@ -83,7 +202,7 @@ async def startup_event():
                 }
             }
             
-            es.indices.create(index=INDEX_NAME, body=mapping)
+            await es.indices.create(index=INDEX_NAME, body=mapping)
             logger.info(f"인덱스 '{INDEX_NAME}' 생성 완료")
         else:
             logger.info(f"인덱스 '{INDEX_NAME}' 이미 존재")
@@ -91,11 +210,26 @@ async def startup_event():
     except Exception as e:
         logger.error(f"인덱스 생성 중 오류: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """애플리케이션 종료 시 버퍼에 남은 문서 색인 후 연결 종료"""
+    global flush_stopping
+    if flush_task:
+        # 종료 신호 이전에 대기열에 들어간 문서와 처리 중인 배치를 모두 색인할 때까지 대기
+        flush_stopping = True
+        await index_queue.put(_STOP)
+        try:
+            await flush_task
+        except Exception as e:
+            logger.error(f"종료 전 버퍼 색인 중 오류: {e}")
+
+    await es.close()
+
 @app.get("/")
 async def root():
     """헬스체크 엔드포인트"""
     try:
-        es_info = es.info()
+        es_info = await es.info()
         return {
             "message": "Elasticsearch BM25 API",
             "elasticsearch_status": "connected",
@@ -108,46 +242,66 @@ async def root():
             "error": str(e)
         }
 
-@app.post("/documents/", response_model=Dict[str, str])
+@app.post("/documents/", response_model=Dict[str, str], status_code=202)
 async def add_document(document: Document):
-    """문서 추가"""
+    """문서 추가 (버퍼에 적재 후 bulk 색인)"""
     try:
-        response = es.index(
-            index=INDEX_NAME,
-            id=document.id,
-            body={
-                "title": document.title,
-                "content": document.content,
-                "category": document.category
-            }
-        )
-        
-        # 인덱스 새로고침 (테스트용)
-        es.indices.refresh(index=INDEX_NAME)
-        
-        return {"message": f"문서 '{document.id}' 추가 완료", "result": response.body["result"]}
+        index_queue.put_nowait(_index_action(document))
+        return {"message": f"문서 '{document.id}' 색인 대기열 추가 완료", "result": "queued"}
     
+    except asyncio.QueueFull:
+        logger.warning(f"색인 대기열이 가득 차 문서 '{document.id}' 추가 거부")
+        raise HTTPException(status_code=503, detail="색인 대기열이 가득 찼습니다. 잠시 후 다시 시도해주세요")
     except Exception as e:
         logger.error(f"문서 추가 중 오류: {e}")
         raise HTTPException(status_code=500, detail=f"문서 추가 실패: {str(e)}")
 
+@app.post("/documents/bulk", response_model=Dict[str, Any])
+async def add_documents_bulk(documents: List[Document], refresh: bool = False):
+    """문서 일괄 추가 (refresh=true이면 검색 가능해질 때까지 대기)"""
+    try:
+        success, errors = await _bulk_index(
+            [_index_action(document) for document in documents],
+            refresh=refresh
+        )
+        if errors:
+            logger.error(f"bulk 색인 중 {len(errors)}건 실패: {errors[:3]}")
+        
+        return {
+            "message": f"문서 {success}개 추가 완료",
+            "indexed": success,
+            "failed": len(errors)
+        }
+    
+    except Exception as e:
+        logger.error(f"문서 일괄 추가 중 오류: {e}")
+        raise HTTPException(status_code=500, detail=f"문서 일괄 추가 실패: {str(e)}")
+
 @app.post("/search/", response_model=SearchResponse)
 async def search_documents(search_query: SearchQuery):
     """BM25를 이용한 문서 검색"""
     try:
         # BM25 쿼리 구성
+        multi_match = {
+            "query": search_query.query,
+            "fields": ["title^2", "content"],  # title 필드에 2배 가중치
+            "type": "best_fields"
+        }
+        
+        # 퍼지 검색은 요청 시에만 사용 (텀 확장 범위 제한)
+        if search_query.fuzzy:
+            multi_match.update({
+                "fuzziness": "AUTO",
+                "prefix_length": search_query.prefix_length,
+                "max_expansions": 20,
+                "fuzzy_transpositions": True
+            })
+        
         query_body = {
             "query": {
                 "bool": {
                     "must": [
-                        {
-                            "multi_match": {
-                                "query": search_query.query,
-                                "fields": ["title^2", "content"],  # title 필드에 2배 가중치
-                                "type": "best_fields",
-                                "fuzziness": "AUTO" # <- 퍼지 검색 설정정
-                            }
-                        }
+                        {"multi_match": multi_match}
                     ]
                 }
             },
@@ -162,25 +316,29 @@ async def search_documents(search_query: SearchQuery):
             ]
         
         # Elasticsearch 검색 실행
-        response = es.search(index=INDEX_NAME, body=query_body)
-        
-        # 결과 파싱
-        hits = response.body["hits"]
-        results = []
+        response = await es.search(
+            index=INDEX_NAME,
+            body=query_body,
+            filter_path=SEARCH_FILTER_PATH
+        )
         
-        for hit in hits["hits"]:
-            results.append(SearchResult(
+        # 결과 파싱 (결과가 없으면 filter_path로 인해 hits.hits가 생략됨)
+        hits = response.body.get("hits", {})
+        results = [
+            SearchResult(
                 id=hit["_id"],
                 title=hit["_source"]["title"],
                 content=hit["_source"]["content"],
                 category=hit["_source"].get("category"),
                 score=hit["_score"]
-            ))
+            )
+            for hit in hits.get("hits", [])
+        ]
         
         return SearchResponse(
-            total=hits["total"]["value"],
+            total=hits.get("total", {}).get("value", 0),
             results=results,
-            took=response.body["took"]
+            took=response.body.get("took", 0)
         )
         
     except Exception as e:
@@ -188,11 +346,14 @@ async def search_documents(search_query: SearchQuery):
         raise HTTPException(status_code=500, detail=f"검색 실패: {str(e)}")
 
 @app.delete("/documents/{doc_id}")
-async def delete_document(doc_id: str):
-    """문서 삭제"""
+async def delete_document(doc_id: str, refresh: bool = False):
+    """문서 삭제 (refresh=true이면 검색에 반영될 때까지 대기)"""
     try:
-        response = es.delete(index=INDEX_NAME, id=doc_id)
-        es.indices.refresh(index=INDEX_NAME)
+        response = await es.delete(
+            index=INDEX_NAME,
+            id=doc_id,
+            refresh="wait_for" if refresh else False
+        )
         return {"message": f"문서 '{doc_id}' 삭제 완료"}
     
     except Exception as e:
@@ -203,7 +364,7 @@ async def delete_document(doc_id: str):
 async def get_document_count():
     """인덱스의 총 문서 수 조회"""
     try:
-        response = es.count(index=INDEX_NAME)
+        response = await es.count(index=INDEX_NAME)
         return {"count": response.body["count"]}
     except Exception as e:
         logger.error(f"문서 수 조회 중 오류: {e}")
@@ -40,6 +40,14 @@ SAMPLE_DOCUMENTS = [
 
 BASE_URL = "http://localhost:8000"
 
+async def delete_documents(doc_ids: List[str]):
+    """문서 동시 삭제 (존재하지 않는 문서는 무시)"""
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30.0) as client:
+        await asyncio.gather(
+            *(client.delete(f"/documents/{doc_id}") for doc_id in doc_ids),
+            return_exceptions=True
+        )
+
 class TestBM25Search:
     """BM25 검색 기능 테스트 클래스"""
     
@@ -49,7 +57,7 @@ class TestBM25Search:
         return httpx.Client(base_url=BASE_URL, timeout=30.0)
     
     @pytest.fixture(scope="class", autouse=True)
-    async def setup_test_data(self, client):
+    def setup_test_data(self, client):
         """테스트 데이터 설정"""
         print("\n🔧 테스트 데이터 설정 중...")
         
@@ -68,31 +76,21 @@ class TestBM25Search:
                 time.sleep(2)
         
         # 기존 문서 삭제
-        for doc in SAMPLE_DOCUMENTS:
-            try:
-                client.delete(f"/documents/{doc['id']}")
-            except:
-                pass
-        
-        # 테스트 문서 추가
-        for doc in SAMPLE_DOCUMENTS:
-            response = client.post("/documents/", json=doc)
-            assert response.status_code == 200
-            print(f"✅ 문서 '{doc['id']}' 추가 완료")
-        
-        # 인덱싱 완료 대기
-        time.sleep(2)
+        asyncio.run(delete_documents([doc["id"] for doc in SAMPLE_DOCUMENTS]))
+        
+        # 테스트 문서 일괄 추가 (refresh=true로 검색 가능해질 때까지 대기)
+        response = client.post("/documents/bulk", params={"refresh": "true"}, json=SAMPLE_DOCUMENTS)
+        assert response.status_code == 200
+        assert response.json()["indexed"] == len(SAMPLE_DOCUMENTS)
+        print(f"✅ 문서 {len(SAMPLE_DOCUMENTS)}개 추가 완료")
+        
         print("✅ 테스트 데이터 설정 완료\n")
         
         yield
         
         # 테스트 후 정리
         print("\n🧹 테스트 데이터 정리 중...")
-        for doc in SAMPLE_DOCUMENTS:
-            try:
-                client.delete(f"/documents/{doc['id']}")
-            except:
-                pass
+        asyncio.run(delete_documents([doc["id"] for doc in SAMPLE_DOCUMENTS]))
         print("✅ 테스트 데이터 정리 완료")
     
     def test_server_health(self, client):
@@ -217,7 +215,8 @@ class TestBM25Search:
         """퍼지 검색 테스트 (오타 허용)"""
         search_query = {
             "query": "Pythom",  # 의도적 오타
-            "size": 5
+            "size": 5,
+            "fuzzy": True
         }
         
         response = client.post("/search/", json=search_query)
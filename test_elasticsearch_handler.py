@@ -1,6 +1,8 @@
 import logging
 import os
-from elasticsearch_handler import ElasticsearchHandler
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError
+from elasticsearch_handler import ElasticsearchHandler, RRF_RANK_CONSTANT, _reciprocal_rank_fusion, _rrf_unsupported
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -43,6 +45,9 @@ def test_elasticsearch_handler():
         success = handler.insert_embeddings(test_contents, test_metadata)
         print(f"데이터 삽입 결과: {success}")
         
+        # 검색에 바로 반영되도록 새로고침
+        handler.refresh()
+        
         # 2. 인덱스 통계 확인
         print("\n=== 인덱스 통계 ===")
         stats = handler.get_index_stats()
@@ -101,5 +106,49 @@ def test_elasticsearch_handler():
         # 연결 종료
         handler.close()
 
+def _api_error(status: int, error_type: str, reason: str) -> ApiError:
+    """Elasticsearch 오류 응답 본문으로 ApiError 생성"""
+    meta = ApiResponseMeta(status, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200))
+    body = {
+        "error": {
+            "type": error_type,
+            "reason": reason,
+            "root_cause": [{"type": error_type, "reason": reason}]
+        },
+        "status": status
+    }
+    return ApiError(error_type, meta, body)
+
+def test_rrf_unsupported_on_license_error():
+    """라이선스 미지원 403은 클라이언트 RRF로 전환"""
+    error = _api_error(403, "security_exception", "current license is non-compliant for [Reciprocal Rank Fusion (RRF)]")
+    assert _rrf_unsupported(error)
+
+def test_rrf_unsupported_on_unknown_retriever():
+    """RRF retriever를 모르는 구버전의 400은 클라이언트 RRF로 전환"""
+    error = _api_error(400, "x_content_parse_exception", "[1:13] unknown retriever [rrf]")
+    assert _rrf_unsupported(error)
+
+def test_rrf_supported_on_query_error():
+    """쿼리 자체의 400이나 권한 없음 403은 전환하지 않음"""
+    assert not _rrf_unsupported(_api_error(400, "illegal_argument_exception", "[num_candidates] cannot exceed [10000]"))
+    assert not _rrf_unsupported(_api_error(403, "security_exception", "action [indices:data/read/search] is unauthorized"))
+
+def test_reciprocal_rank_fusion():
+    """두 결과 목록을 순위 기반으로 결합하고 top_k개만 반환"""
+    def result(doc_id: str, score: float) -> dict:
+        return {"id": doc_id, "score": score, "content": doc_id, "metadata": {}}
+
+    bm25_results = [result("a", 12.0), result("b", 8.0), result("c", 3.0)]
+    vector_results = [result("b", 0.9), result("d", 0.8), result("a", 0.7)]
+
+    fused = _reciprocal_rank_fusion([bm25_results, vector_results], top_k=3)
+
+    # b: 2위 + 1위, a: 1위 + 3위, d: 2위, c: 3위
+    assert [r["id"] for r in fused] == ["b", "a", "d"]
+    assert fused[0]["score"] == 1 / (RRF_RANK_CONSTANT + 2) + 1 / (RRF_RANK_CONSTANT + 1)
+    assert fused[2]["score"] == 1 / (RRF_RANK_CONSTANT + 2)
+    assert fused[0]["content"] == "b"
+
 if __name__ == "__main__":
     test_elasticsearch_handler() 
\ No newline at end of file